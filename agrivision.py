@@ -26,13 +26,8 @@ import sys
 from datetime import datetime
 import ast
 import os
-
-## Constants
-try:
-    CONFIG_FILE = '%s' % sys.argv[1]
-except Exception as err:
-    settings = open('settings.cfg').read()
-    CONFIG_FILE = settings.rstrip()
+from buffers import FramePool, percentile, median_index
+import calibration
 
 def pretty_print(task, msg, *args):
     date = datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S.%f")
@@ -41,19 +36,38 @@ def pretty_print(task, msg, *args):
 
 ## Class
 class AgriVision:
-    def __init__(self, config_file):
+    """
+    config_file: path of a mode file, or the loaded config
+    headless: vision path and PID only, no cameras, controller, log, database,
+    GPS or display, e.g. to replay frames in tests and the simulator
+    calibrate: passed on to init_vision
+    overrides: config keys to replace, e.g. CAMERAS=1
+    """
+    def __init__(self, config_file, headless=False, calibrate=True, **overrides):
 
         # Load Config
-        pretty_print("CONFIG", "Loading %s" % config_file)
-        self.config = json.loads(open(config_file).read())
+        if isinstance(config_file, dict):
+            self.config = dict(config_file)
+        else:
+            pretty_print("CONFIG", "Loading %s" % config_file)
+            self.config = json.loads(open(config_file).read())
+        self.config.update(overrides)
         for key in self.config:
             try:
                 getattr(self, key)
             except AttributeError as error:
                 setattr(self, key, self.config[key])
         
+        # Headless
+        if headless:
+            self.cameras = []
+            self.init_vision(calibrate)
+            self.init_pid()
+            return
+        
         # Initializers
         self.init_log() # it's best to run the log first to catch all events
+        self.init_vision()
         self.init_cameras()
         self.init_controller()
         self.init_pid()
@@ -61,8 +75,12 @@ class AgriVision:
         self.init_gps()
         if self.DISPLAY_ON: self.init_display()
         
-    # Initialize Cameras
-    def init_cameras(self):
+    # Initialize Vision
+    """
+    Geometry, thresholds, frame buffers and calibrations; touches no camera
+    calibrate: False leaves every camera uncalibrated and writes no cache
+    """
+    def init_vision(self, calibrate=True):
         
         # Setting variables
         pretty_print('CAM', 'Initializing CV Variables')
@@ -91,10 +109,31 @@ class AgriVision:
         self.threshold_min = np.array([self.HUE_MIN, self.SAT_MIN, self.VAL_MIN], np.uint8)
         self.threshold_max = np.array([self.HUE_MAX, self.SAT_MAX, self.VAL_MAX], np.uint8)
         
+        # Allocate frame buffers once, the run-time loop fills them in place
+        pretty_print('CAM', 'Allocating Frame Buffers')
+        self.pool = FramePool(self.CAMERAS, self.CAMERA_WIDTH, self.CAMERA_HEIGHT, self.CAMERA_ROTATED)
+        
+        # Load lens and ground-plane calibration, if any
+        self.calibrations = []
+        for i in range(self.CAMERAS):
+            if not calibrate:
+                self.calibrations.append(None)
+                continue
+            try:
+                self.calibrations.append(calibration.load(self.CALIBRATION_DIR, i, self.CAMERA_WIDTH, self.CAMERA_HEIGHT, self.CAMERA_CENTER, self.PIXEL_PER_CM))
+                columns = self.calibrations[i].columns
+                pretty_print('CAM', 'Camera #%d calibrated: %.1f to %.1f cm' % (i, columns[0], columns[-1]))
+            except Exception as error:
+                self.calibrations.append(None)
+                pretty_print('CAM', 'WARNING: Camera #%d not calibrated: %s' % (i, str(error)))
+    
+    # Initialize Cameras
+    def init_cameras(self):
+        
         # Attempt to set each camera index/name
         pretty_print('CAM', 'Initializing Cameras')
         self.cameras = []
-        self.images = []
+        self.images = [None] * self.CAMERAS
         for i in range(self.CAMERAS):
             try:
                 if self.VERBOSE: pretty_print('CAM', 'Attaching Camera #%d' % i)
@@ -110,7 +149,6 @@ class AgriVision:
                     cam.set(cv.CV_CAP_PROP_FRAME_WIDTH, self.CAMERA_HEIGHT)
                     cam.set(cv.CV_CAP_PROP_FRAME_HEIGHT, self.CAMERA_WIDTH)
                 self.cameras.append(cam)
-		self.images.append(np.zeros((self.CAMERA_HEIGHT, self.CAMERA_WIDTH, 3), np.uint8))
                 if self.VERBOSE: pretty_print('CAM', 'Camera #%d OK' % i)
             except Exception as error:
                 pretty_print('CAM', 'ERROR: %s' % str(error))
@@ -140,7 +178,9 @@ class AgriVision:
         if self.VERBOSE: pretty_print('PID', 'PWM Center: %d' % self.CENTER_PWM)
         try:
             if self.VERBOSE: pretty_print('PID', 'Default Number of Averages: %d' % self.NUM_AVERAGES)
-            self.offset_history = [self.CAMERA_CENTER] * self.NUM_AVERAGES
+            self.offset_history = np.empty(self.NUM_AVERAGES) # ring buffer of recent estimates
+            self.offset_history.fill(self.CAMERA_CENTER)
+            self.history_index = 0
             if self.VERBOSE: pretty_print('PID', 'Setup OK')
         except Exception as error:
             pretty_print('PID', 'ERROR: %s' % str(error))
@@ -190,16 +230,24 @@ class AgriVision:
         if self.VERBOSE: pretty_print('INIT', 'Initializing Display')
         try:
             self.updating = False
+            self.display_state = (self.CAMERA_CENTER, 0.0) # blank canvas until the first frame
             if self.DISPLAY_ON:
+                self.updating = True
                 thread.start_new_thread(self.update_display, ())
         except Exception as error:
             pretty_print('DISP', 'ERROR: %s' % str(error))
 
     ## Rotate image
-    def rotate_image(self, bgr):
-        bgr = cv2.transpose(bgr)
+    def rotate_image(self, bgr, dst=None):
+        bgr = cv2.transpose(bgr, dst)
         return bgr
 
+    ## Capture Images
+    """
+    1. Swap to the older of the two frame buffers for each camera
+    2. Read (and rotate) into that buffer
+    3. Compare against the previous buffer to catch frozen frames
+    """
     def capture_images(self):
         a = time.time()
         pretty_print('CAM', 'Capturing Images ...')
@@ -207,10 +255,16 @@ class AgriVision:
         for i in range(self.CAMERAS):
             pretty_print('CAM', 'Attempting on Camera #%d' % i)
             try:
-                (s, bgr) = self.cameras[i].read()
-                if s and (self.images[i] is not None):
-                    if self.CAMERA_ROTATED: bgr = self.rotate_image(bgr)
-                    if np.all(bgr==self.images[i]):
+                (bgr, previous) = self.pool.swap(i)
+                target = self.pool.capture_buffer(i, bgr)
+                (s, frame) = self.cameras[i].read(target)
+                if s and (frame is not target):
+                    pretty_print('CAM', 'WARNING: Frame reallocated: %s' % str(frame.shape))
+                    self.pool.miss('capture')
+                    cv2.resize(frame, (target.shape[1], target.shape[0]), target)
+                if s:
+                    if self.CAMERA_ROTATED: self.rotate_image(target, bgr)
+                    if cv2.norm(bgr, previous, cv2.NORM_INF) == 0:
                         images.append(None)
                         pretty_print('CAM', 'ERROR: Frozen frame')
                     else:
@@ -218,7 +272,8 @@ class AgriVision:
                         images.append(bgr)
                 else:
                     pretty_print('CAM', 'ERROR: Capture failed')
-                    self.images[i] = np.zeros((self.CAMERA_HEIGHT, self.CAMERA_WIDTH, 3), np.uint8)
+                    bgr.fill(0)
+                    images.append(None)
             except KeyboardInterrupt:
                 raise KeyboardInterrupt
             except:
@@ -239,15 +294,18 @@ class AgriVision:
         pretty_print('BPPD', 'Filtering for plants ...')
         a = time.time()
         masks = []
-        for bgr in images:
+        for (i, bgr) in enumerate(images):
             if bgr is not None:
                 try:
-                    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
-                    self.threshold_min[1] = np.percentile(hsv[:,:,1], 100 * self.SAT_MIN / 255.0) # overwrite the saturation minima
-                    self.threshold_min[2] = np.percentile(hsv[:,:,2], 100 * self.VAL_MIN / 255.0) # overwrite the value minima
-		    self.threshold_max[1] = 255
-		    self.threshold_max[2] = np.percentile(hsv[:,:,2], 100 * self.VAL_MAX / 255.0)
-                    mask = cv2.inRange(hsv, self.threshold_min, self.threshold_max)
+                    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV, self.pool.hsv[i])
+                    scratch = self.pool.scratch[i]
+                    (sat_min,) = percentile(hsv[:,:,1], [100 * self.SAT_MIN / 255.0], scratch)
+                    (val_min, val_max) = percentile(hsv[:,:,2], [100 * self.VAL_MIN / 255.0, 100 * self.VAL_MAX / 255.0], scratch)
+                    self.threshold_min[1] = sat_min # overwrite the saturation minima
+                    self.threshold_min[2] = val_min # overwrite the value minima
+                    self.threshold_max[1] = 255
+                    self.threshold_max[2] = val_max
+                    mask = cv2.inRange(hsv, self.threshold_min, self.threshold_max, self.pool.masks[i])
                     masks.append(mask)
                     if self.VERBOSE: pretty_print('BPPD', 'Mask Number #%d was successful' % len(masks))                    
                 except Exception as error:
@@ -271,23 +329,25 @@ class AgriVision:
         a = time.time()
         offsets = []
 	sums = []
-        for mask in masks:
+        for (i, mask) in enumerate(masks):
             if mask is not None:
                 try:
-                    column_sum = mask.sum(axis=0) # vertical summation
-                    threshold = np.percentile(column_sum, self.THRESHOLD_PERCENTILE)
-                    probable = np.nonzero(column_sum >= threshold) # returns 1 length tuble
+                    column_sum = self.pool.column_sums[i]
+                    mask.sum(axis=0, dtype=column_sum.dtype, out=column_sum) # vertical summation
+                    if self.calibrations[i] is not None:
+                        column_sum = self.calibrations[i].apply(column_sum, self.pool.ground_sums[i], self.pool.remap_scratch[i]) # onto the ground grid
+                    (threshold,) = percentile(column_sum, [self.THRESHOLD_PERCENTILE], self.pool.profile[i])
+                    probable = np.greater_equal(column_sum, threshold, self.pool.probable[i])
                     if self.DEBUG:
                         fig = plt.figure()
                         plt.plot(range(self.CAMERA_WIDTH), column_sum)
                         plt.show()
                         time.sleep(0.1)
                         plt.close(fig)
-                    num_probable = len(probable[0])
+                    (best, num_probable) = median_index(probable, self.pool.ranks[i])
 		    if (num_probable == self.CAMERA_WIDTH * self.THRESHOLD_PERCENTILE / 100.0):
 			print "WARNING"
 			time.sleep(1)
-                    best = int(np.median(probable[0]))
 		    sum = column_sum[best]
 		    centroid = best - self.CAMERA_CENTER
                     offsets.append(centroid)
@@ -311,16 +371,13 @@ class AgriVision:
         a = time.time()
         if self.VERBOSE: pretty_print('ROW', 'Smoothing offset estimation ...')
         try:
-	    indices = np.array(indices)
-	    sums = np.array(sums)
-            est =  indices[np.argmax(sums)]
+            est = indices[sums.index(max(sums))]
         except Exception as error:
             pretty_print('ROW', 'ERROR: %s' % str(error))
             est = self.CAMERA_CENTER
-        self.offset_history.append(est)
-        while len(self.offset_history) > self.NUM_AVERAGES:
-            self.offset_history.pop(0)
-        avg = int(np.mean(self.offset_history)) #!TODO
+        self.offset_history[self.history_index] = est
+        self.history_index = (self.history_index + 1) % self.NUM_AVERAGES
+        avg = int(self.offset_history.mean()) #!TODO
         diff = est - avg #!TODO can be a little more clever e.g. np.gradient, np.convolve
         if self.VERBOSE:
             pretty_print('ROW', 'Est = %.2f' % est)
@@ -418,104 +475,119 @@ class AgriVision:
         except Exception as error:
             pretty_print('LOG', 'ERROR: %s' % str(error))
                 
+    ## Compose the Display
+    """
+    Runs on the main thread, so the pooled images and masks are not
+    overwritten by the next capture while they are being copied
+    1. Copy RGB images (or ABP masks if highlighting) side by side
+    2. Draw lines on RGB images
+    3. Draw lines on ABP masks
+    """
+    def compose_display(self):
+        if self.VERBOSE: pretty_print('DISP', 'Composing Images ...')
+        try:
+            average = self.average + self.CAMERA_CENTER
+            masks = self.masks
+            images = self.images
+            output_padded = self.pool.canvas # images side by side with blank space below
+            output_padded[self.CAMERA_HEIGHT:].fill(0)
+            for i in xrange(self.CAMERAS):
+                try:
+                    if self.VERBOSE: pretty_print('DISP', 'Image #%d' % (i+1))
+                    img = images[i]
+                    mask = masks[i]
+                    x = i * self.CAMERA_WIDTH
+                    tile = output_padded[:self.CAMERA_HEIGHT, x:x + self.CAMERA_WIDTH]
+                    (pixel_min, pixel_max, center, row) = (self.PIXEL_MIN, self.PIXEL_MAX, self.CAMERA_CENTER, average)
+                    if self.calibrations[i] is not None: # offsets are on the ground grid, draw them where they fall on the image
+                        (pixel_min, pixel_max, center, row) = [self.calibrations[i].column(j) for j in (pixel_min, pixel_max, center, row)]
+                    if self.HIGHLIGHT:
+                        if mask is None:
+                            tile.fill(0)
+                        else:
+                            if self.VERBOSE: pretty_print('DISP', 'Mask shape: %s' % str(mask.shape))
+                            np.copyto(tile, mask[:, :, np.newaxis])
+                        tile[:, pixel_min, 2] =  255
+                        tile[:, pixel_max, 2] =  255
+                        tile[:, center, 1] =  255
+                        tile[:, row, 0] = 255
+                        if self.VERBOSE: pretty_print('DISP', 'Highlighted detected plants')
+                    else:
+                        if img is None:
+                            tile.fill(0)
+                        else:
+                            if self.VERBOSE: pretty_print('DISP', 'Img shape: %s' % str(img.shape))
+                            np.copyto(tile, img)
+                        cv2.line(output_padded, (x + pixel_min, 0), (x + pixel_min, self.CAMERA_HEIGHT), (0,0,255), 1)
+                        cv2.line(output_padded, (x + pixel_max, 0), (x + pixel_max, self.CAMERA_HEIGHT), (0,0,255), 1)
+                        cv2.line(output_padded, (x + row, 0), (x + row, self.CAMERA_HEIGHT), (0,255,0), 2)
+                        cv2.line(output_padded, (x + center, 0), (x + center, self.CAMERA_HEIGHT), (255,255,255), 1)
+                except Exception as error:
+                    pretty_print('DISP', 'ERROR: %s' % str(error))
+            self.display_state = (average, self.volts) # what the canvas shows, for the display thread
+        except Exception as error:
+            pretty_print('DISP', str(error))
+
     ## Update the Display
     """
-    0. Check for concurrent update process
-    1. Draw lines on RGB images
-    2. Draw lines on ABP masks
+    Runs on its own thread, started only once the previous one has finished;
+    the caller sets self.updating, this clears it
+    1. Scale up the composed canvas
+    2. Draw offset, voltage and arrow
     3. Output GUI display
     """
     def update_display(self):
         a = time.time()
-        if self.updating:
-            return # if the display is already updating, wait and exit (puts less harm on the CPU)
-        else:
-            self.updating = True
-            if self.VERBOSE: pretty_print('DISP', 'Displaying Images ...')
-            try:
-                pwm = self.pwm
-                average = self.average + self.CAMERA_CENTER
-                estimated = self.estimated  + self.CAMERA_CENTER
-                masks = self.masks
-                images = self.images
-                volts = self.volts
-                output_images = []
-                distance = round((average - self.CAMERA_CENTER) / float(self.PIXEL_PER_CM), 1)
-                if self.VERBOSE: pretty_print('DISP', 'Offset Distance: %d' % distance)
-                for i in xrange(self.CAMERAS):
-                    try:
-                        if self.VERBOSE: pretty_print('DISP', 'Image #%d' % (i+1))
-                        img = images[i]
-                        mask = masks[i]
-                        if img is None: img = np.zeros((self.CAMERA_HEIGHT, self.CAMERA_WIDTH, 3), np.uint8)
-                        if mask is None: mask = np.zeros((self.CAMERA_HEIGHT, self.CAMERA_WIDTH), np.uint8)
-                        (h, w, d) = img.shape
-                        if self.VERBOSE: pretty_print('DISP', 'Mask shape: %s' % str(mask.shape))
-                        if self.VERBOSE: pretty_print('DISP', 'Img shape: %s' % str(img.shape))
-                        if self.HIGHLIGHT:
-                            img = np.dstack((mask, mask, mask))
-                            img[:, self.PIXEL_MIN, 2] =  255
-                            img[:, self.PIXEL_MAX, 2] =  255
-                            img[:, self.CAMERA_CENTER, 1] =  255
-                            img[:, average, 0] = 255
-                            if self.VERBOSE: pretty_print('DISP', 'Highlighted detected plants')
-                        else:
-                            cv2.line(img, (self.PIXEL_MIN, 0), (self.PIXEL_MIN, self.CAMERA_HEIGHT), (0,0,255), 1)
-                            cv2.line(img, (self.PIXEL_MAX, 0), (self.PIXEL_MAX, self.CAMERA_HEIGHT), (0,0,255), 1)
-                            cv2.line(img, (average, 0), (average, self.CAMERA_HEIGHT), (0,255,0), 2)
-                            cv2.line(img, (self.CAMERA_CENTER, 0), (self.CAMERA_CENTER, self.CAMERA_HEIGHT), (255,255,255), 1)
-                        output_images.append(img)
-                    except Exception as error:
-                        pretty_print('DISP', 'ERROR: %s' % str(error))
-                if self.VERBOSE: pretty_print('DISP', 'Stacking images ...')
-                output_small = np.hstack(output_images)
-                pad = np.zeros((self.CAMERA_HEIGHT * 0.1, self.CAMERAS * self.CAMERA_WIDTH, 3), np.uint8) # add blank space
-                output_padded = np.vstack([output_small, pad])
-                if self.VERBOSE: pretty_print('DISP', 'Padded image')
-                output_large = cv2.resize(output_padded, (self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT))
+        if self.VERBOSE: pretty_print('DISP', 'Displaying Images ...')
+        try:
+            (average, volts) = self.display_state
+            distance = round((average - self.CAMERA_CENTER) / float(self.PIXEL_PER_CM), 1)
+            if self.VERBOSE: pretty_print('DISP', 'Offset Distance: %d' % distance)
+            output_large = self.pool.display_buffer(self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT)
+            cv2.resize(self.pool.canvas, (self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT), output_large)
 
-                # Offset Distance
-                if average - self.CAMERA_CENTER >= 0:
-                    distance_str = str("+%2.1f cm" % distance)
-                elif average - self.CAMERA_CENTER< 0:
-                    distance_str = str("%2.1f cm" % distance)
-                cv2.putText(output_large, distance_str, (int(self.DISPLAY_WIDTH * 0.01), int(self.DISPLAY_WIDTH * 0.74)), cv2.FONT_HERSHEY_SIMPLEX, 2, (255,255,255), 4)
-                
-                # Output Voltage
-                volts_str = str("%2.1f V" % volts)
-                cv2.putText(output_large, volts_str, (int(self.DISPLAY_WIDTH * 0.82), int(self.DISPLAY_WIDTH * 0.74)), cv2.FONT_HERSHEY_SIMPLEX, 2, (255,255,255), 4)
-                
-                # Arrow
-                if average - self.CAMERA_CENTER >= 0:
-                    p = (int(self.DISPLAY_WIDTH * 0.45), int(self.DISPLAY_WIDTH * 0.72))
-                    q = (int(self.DISPLAY_WIDTH * 0.55), int(self.DISPLAY_WIDTH * 0.72))
-                elif average - self.CAMERA_CENTER< 0:
-                    p = (int(self.DISPLAY_WIDTH * 0.55), int(self.DISPLAY_WIDTH * 0.72))
-                    q = (int(self.DISPLAY_WIDTH * 0.45), int(self.DISPLAY_WIDTH * 0.72))
-                color = (255,255,255)
-                thickness = 8
-                line_type = 8
-                shift = 0
-                arrow_magnitude=20
-                cv2.line(output_large, p, q, color, thickness, line_type, shift) # draw arrow tail
-                angle = np.arctan2(p[1]-q[1], p[0]-q[0])
-                p = (int(q[0] + arrow_magnitude * np.cos(angle + np.pi/4)), # starting point of first line of arrow head 
-                int(q[1] + arrow_magnitude * np.sin(angle + np.pi/4)))
-                cv2.line(output_large, p, q, color, thickness, line_type, shift) # draw first half of arrow head
-                p = (int(q[0] + arrow_magnitude * np.cos(angle - np.pi/4)), # starting point of second line of arrow head 
-                int(q[1] + arrow_magnitude * np.sin(angle - np.pi/4)))
-                cv2.line(output_large, p, q, color, thickness, line_type, shift) # draw second half of arrow head
-                
-                # Draw GUI
-                cv2.namedWindow('Agri-Vision', cv2.WINDOW_NORMAL)
-                if self.FULLSCREEN: cv2.setWindowProperty('Agri-Vision', cv2.WND_PROP_FULLSCREEN, cv2.cv.CV_WINDOW_FULLSCREEN)
-                if self.VERBOSE: pretty_print('DISP', 'Output shape: %s' % str(output_large.shape))
-                cv2.imshow('Agri-Vision', output_large)
-                if cv2.waitKey(5) == 0:
-                    pass
-            except Exception as error:
-                pretty_print('DISP', str(error))
-            self.updating = False
+            # Offset Distance
+            if average - self.CAMERA_CENTER >= 0:
+                distance_str = str("+%2.1f cm" % distance)
+            elif average - self.CAMERA_CENTER< 0:
+                distance_str = str("%2.1f cm" % distance)
+            cv2.putText(output_large, distance_str, (int(self.DISPLAY_WIDTH * 0.01), int(self.DISPLAY_WIDTH * 0.74)), cv2.FONT_HERSHEY_SIMPLEX, 2, (255,255,255), 4)
+            
+            # Output Voltage
+            volts_str = str("%2.1f V" % volts)
+            cv2.putText(output_large, volts_str, (int(self.DISPLAY_WIDTH * 0.82), int(self.DISPLAY_WIDTH * 0.74)), cv2.FONT_HERSHEY_SIMPLEX, 2, (255,255,255), 4)
+            
+            # Arrow
+            if average - self.CAMERA_CENTER >= 0:
+                p = (int(self.DISPLAY_WIDTH * 0.45), int(self.DISPLAY_WIDTH * 0.72))
+                q = (int(self.DISPLAY_WIDTH * 0.55), int(self.DISPLAY_WIDTH * 0.72))
+            elif average - self.CAMERA_CENTER< 0:
+                p = (int(self.DISPLAY_WIDTH * 0.55), int(self.DISPLAY_WIDTH * 0.72))
+                q = (int(self.DISPLAY_WIDTH * 0.45), int(self.DISPLAY_WIDTH * 0.72))
+            color = (255,255,255)
+            thickness = 8
+            line_type = 8
+            shift = 0
+            arrow_magnitude=20
+            cv2.line(output_large, p, q, color, thickness, line_type, shift) # draw arrow tail
+            angle = np.arctan2(p[1]-q[1], p[0]-q[0])
+            p = (int(q[0] + arrow_magnitude * np.cos(angle + np.pi/4)), # starting point of first line of arrow head 
+            int(q[1] + arrow_magnitude * np.sin(angle + np.pi/4)))
+            cv2.line(output_large, p, q, color, thickness, line_type, shift) # draw first half of arrow head
+            p = (int(q[0] + arrow_magnitude * np.cos(angle - np.pi/4)), # starting point of second line of arrow head 
+            int(q[1] + arrow_magnitude * np.sin(angle - np.pi/4)))
+            cv2.line(output_large, p, q, color, thickness, line_type, shift) # draw second half of arrow head
+            
+            # Draw GUI
+            cv2.namedWindow('Agri-Vision', cv2.WINDOW_NORMAL)
+            if self.FULLSCREEN: cv2.setWindowProperty('Agri-Vision', cv2.WND_PROP_FULLSCREEN, cv2.cv.CV_WINDOW_FULLSCREEN)
+            if self.VERBOSE: pretty_print('DISP', 'Output shape: %s' % str(output_large.shape))
+            cv2.imshow('Agri-Vision', output_large)
+            if cv2.waitKey(5) == 0:
+                pass
+        except Exception as error:
+            pretty_print('DISP', str(error))
+        self.updating = False
         b = time.time()
         if self.VERBOSE: pretty_print('DISP', '... %.2f ms' % ((b - a) * 1000))
                     
@@ -601,9 +673,11 @@ class AgriVision:
                 self.volts = volts
                 if self.MONGO_ON: doc_id = self.log_db(sample)
                 if self.LOGFILE_ON: self.log_file(sample)
-                if self.DISPLAY_ON:
+                if self.DISPLAY_ON and not self.updating: # skip frames while the display is busy
                     try:
                         os.environ['DISPLAY']
+                        self.compose_display()
+                        self.updating = True
                         thread.start_new_thread(self.update_display, ())
                     except Exception as error:
                         pretty_print('SYS', 'ERROR: %s' % str(error))
@@ -615,5 +689,10 @@ class AgriVision:
 
 ## Main
 if __name__ == '__main__':
+    try:
+        CONFIG_FILE = '%s' % sys.argv[1]
+    except Exception as err:
+        settings = open('settings.cfg').read()
+        CONFIG_FILE = settings.rstrip()
     session = AgriVision(CONFIG_FILE)
     session.run()
@@ -0,0 +1,178 @@
+"""
+Agri-Vision
+Frame buffer pool for the capture -> mask -> offset path
+
+All arrays used by the run-time loop are allocated once when the cameras are
+initialized, then filled in place through the dst/out arguments of OpenCV and
+NumPy. Frames are double-buffered per camera so the previous capture can be
+compared against the current one (frozen frame check). The display canvas is
+composed on the main thread, so the display thread never reads the frame or
+mask buffers.
+"""
+
+__author__ = 'Tsevor Stanhope'
+
+import numpy as np
+
+## Percentile
+"""
+Same result as np.percentile (linear interpolation), but sorts a copy of
+values held in a preallocated scratch array instead of a fresh one.
+scratch must be contiguous, so that its flat view shares its memory.
+1. Copy values into scratch
+2. Partially sort scratch around the ranks of interest
+3. Interpolate between neighbouring ranks
+"""
+def percentile(values, q, scratch):
+    np.copyto(scratch, values)
+    flat = scratch.reshape(-1)
+    n = flat.size
+    ranks = [p / 100.0 * (n - 1) for p in q]
+    kth = sorted(set([int(np.floor(r)) for r in ranks] + [int(np.ceil(r)) for r in ranks]))
+    flat.partition(kth)
+    results = []
+    for r in ranks:
+        lo = int(np.floor(r))
+        hi = int(np.ceil(r))
+        results.append(float(flat[lo]) + (float(flat[hi]) - float(flat[lo])) * (r - lo))
+    return results
+
+## Median Index
+"""
+Same result as int(np.median(np.nonzero(probable)[0])), without building the
+index array.
+1. Running count of True values into ranks
+2. Locate the middle True value(s) by binary search on the running count
+Returns the median index and the number of True values
+"""
+def median_index(probable, ranks):
+    np.cumsum(probable, dtype=ranks.dtype, out=ranks)
+    n = int(ranks[-1])
+    if n == 0:
+        raise ValueError('No probable columns')
+    lo = int(np.searchsorted(ranks, (n - 1) // 2 + 1))
+    hi = int(np.searchsorted(ranks, n // 2 + 1))
+    return int((lo + hi) / 2.0), n
+
+## Class
+class FramePool:
+    def __init__(self, cameras, width, height, rotated=False, pad=0.1):
+        self.cameras = cameras
+        self.width = width
+        self.height = height
+        self.rotated = rotated
+        self.misses = {}
+        self.active = [0] * cameras
+
+        # Capture
+        self.frames = [[np.zeros((height, width, 3), np.uint8) for k in range(2)] for i in range(cameras)]
+        if rotated:
+            self.raw = [np.zeros((width, height, 3), np.uint8) for i in range(cameras)] # transposed on capture
+        else:
+            self.raw = None
+
+        # Plant filter
+        self.hsv = [np.zeros((height, width, 3), np.uint8) for i in range(cameras)]
+        self.masks = [np.zeros((height, width), np.uint8) for i in range(cameras)]
+        self.scratch = [np.zeros((height, width), np.uint8) for i in range(cameras)]
+
+        # Offset
+        self.column_sums = [np.zeros(width, np.float64) for i in range(cameras)]
+        self.ground_sums = [np.zeros(width, np.float64) for i in range(cameras)] # resampled by the calibration
+        self.remap_scratch = [np.zeros(width, np.float64) for i in range(cameras)]
+        self.profile = [np.zeros(width, np.float64) for i in range(cameras)]
+        self.probable = [np.zeros(width, np.bool_) for i in range(cameras)]
+        self.ranks = [np.zeros(width, np.int32) for i in range(cameras)]
+
+        # Display
+        self.canvas = np.zeros((height + int(height * pad), cameras * width, 3), np.uint8)
+        self.display = None
+
+        self.addresses = dict((name, self.address(a)) for (name, a) in self.buffers())
+
+    ## Address of the data buffer of an array
+    def address(self, array):
+        return array.__array_interface__['data'][0]
+
+    ## All pooled arrays
+    """
+    Returns a list of (name, array) for every array held by the pool
+    """
+    def buffers(self):
+        named = []
+        for i in range(self.cameras):
+            for k in range(2):
+                named.append(('frame%d_%d' % (i, k), self.frames[i][k]))
+            if self.raw is not None:
+                named.append(('raw%d' % i, self.raw[i]))
+            named.append(('hsv%d' % i, self.hsv[i]))
+            named.append(('mask%d' % i, self.masks[i]))
+            named.append(('scratch%d' % i, self.scratch[i]))
+            named.append(('column_sum%d' % i, self.column_sums[i]))
+            named.append(('ground_sum%d' % i, self.ground_sums[i]))
+            named.append(('remap_scratch%d' % i, self.remap_scratch[i]))
+            named.append(('profile%d' % i, self.profile[i]))
+            named.append(('probable%d' % i, self.probable[i]))
+            named.append(('ranks%d' % i, self.ranks[i]))
+        named.append(('canvas', self.canvas))
+        if self.display is not None:
+            named.append(('display', self.display))
+        return named
+
+    ## Display buffer
+    """
+    The display size is only known once the GUI is set up, so the resized
+    output is allocated on first use
+    """
+    def display_buffer(self, width, height):
+        if self.display is None or self.display.shape[:2] != (height, width):
+            if self.display is not None:
+                self.miss('display')
+            self.display = np.zeros((height, width, 3), np.uint8)
+            self.addresses['display'] = self.address(self.display)
+        return self.display
+
+    ## Swap frame buffers
+    """
+    Returns the (current, previous) frame buffers for camera i, the current one
+    being the oldest of the pair and therefore safe to overwrite
+    """
+    def swap(self, i):
+        self.active[i] = 1 - self.active[i]
+        return self.frames[i][self.active[i]], self.frames[i][1 - self.active[i]]
+
+    ## Capture buffer
+    """
+    Buffer handed to VideoCapture.read for camera i
+    """
+    def capture_buffer(self, i, frame):
+        if self.raw is not None:
+            return self.raw[i]
+        return frame
+
+    ## Record a per-frame allocation
+    def miss(self, name):
+        self.misses[name] = self.misses.get(name, 0) + 1
+
+    ## Does the pool own this array
+    def owns(self, array):
+        if array is None:
+            return False
+        for (name, a) in self.buffers():
+            if np.may_share_memory(array, a):
+                return True
+        return False
+
+    ## Allocation regressions
+    """
+    Returns a list of messages, empty if the pool has not been reallocated or
+    bypassed since it was created
+    """
+    def check(self):
+        errors = []
+        for (name, a) in self.buffers():
+            if self.address(a) != self.addresses.get(name):
+                errors.append('%s was reallocated' % name)
+        for name in sorted(self.misses):
+            errors.append('%s allocated %d time(s)' % (name, self.misses[name]))
+        return errors
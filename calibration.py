@@ -0,0 +1,239 @@
+"""
+Agri-Vision
+Lens undistortion and ground-plane calibration
+
+The offline tool (see Main) computes, per camera, the lens intrinsics and
+distortion from checkerboard images, and a homography from undistorted pixels
+to the ground plane from one image of the board lying flat on the ground.
+
+At start-up these are turned into a per-column pixel --> cm lookup for the
+running resolution, i.e. where each image column lies on the ground once
+averaged over its height. From that lookup, a remap table resamples the
+column-sum profile onto the ideal grid that init_vision assumes
+(CAMERA_CENTER, PIXEL_PER_CM), so the rest of the loop is unchanged.
+Both are cached next to the calibration, keyed by resolution.
+
+Usage:
+    python calibration.py modes/default.json 0 'calibrations/camera0/*.png' calibrations/camera0/ground.png
+    python calibration.py modes/default.json 0 'calibrations/camera0/*.png' calibrations/camera0/ground.png --board 9x6 --square 2.5
+"""
+
+__author__ = 'Tsevor Stanhope'
+
+import argparse
+import glob
+import json
+import os
+import numpy as np
+
+## Paths
+def base_path(directory, camera):
+    return os.path.join(directory, 'camera%d.npz' % camera)
+
+def cache_path(directory, camera, width, height):
+    return os.path.join(directory, 'camera%d_%dx%d.npz' % (camera, width, height))
+
+## Checkerboard corners
+"""
+Returns the refined inner corners of the board, or None if not found
+"""
+def find_corners(gray, board):
+    import cv2
+    (found, corners) = cv2.findChessboardCorners(gray, board)
+    if not found:
+        return None
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)
+    return corners
+
+## Board coordinates
+"""
+Inner corners of the board in cm, x along the columns of the board
+"""
+def board_points(board, square):
+    (cols, rows) = board
+    points = np.zeros((cols * rows, 3), np.float32)
+    points[:, :2] = np.mgrid[0:cols, 0:rows].T.reshape(-1, 2) * square
+    return points
+
+## Calibrate
+"""
+1. Find the board in every image and solve for intrinsics and distortion
+2. Find the board in the ground image, undistort its corners
+3. Fit the homography from undistorted pixels to the ground (cm)
+Arguments: lists of BGR images (all the same size), ground image
+Returns: dict of arrays, as saved by save()
+"""
+def calibrate(images, ground, board=(9, 6), square=2.5):
+    import cv2
+    (height, width) = images[0].shape[:2]
+    object_points = []
+    image_points = []
+    for bgr in images:
+        corners = find_corners(cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY), board)
+        if corners is not None:
+            object_points.append(board_points(board, square))
+            image_points.append(corners)
+    if not image_points:
+        raise ValueError('Checkerboard not found in any image')
+    (rms, K, dist, rvecs, tvecs) = cv2.calibrateCamera(object_points, image_points, (width, height), None, None)
+    corners = find_corners(cv2.cvtColor(ground, cv2.COLOR_BGR2GRAY), board)
+    if corners is None:
+        raise ValueError('Checkerboard not found in ground image')
+    undistorted = cv2.undistortPoints(corners, K, dist, P=K)
+    (homography, inliers) = cv2.findHomography(undistorted.reshape(-1, 2), board_points(board, square)[:, :2])
+    return {
+        'size' : np.array([width, height]),
+        'camera_matrix' : K,
+        'distortion' : dist,
+        'homography' : homography,
+        'rms' : np.array(rms),
+        'images' : np.array(len(image_points)),
+    }
+
+def save(path, calibration):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'wb') as f:
+        np.savez(f, **calibration)
+
+## Column lookup
+"""
+1. Scale every pixel of the running resolution back to the calibrated one
+2. Undistort, then project onto the ground with the homography
+3. Average the lateral position over each column
+4. Zero at the center column, positive to the right
+Returns: lateral position (cm) of each image column
+"""
+def column_lookup(calibration, width, height, center):
+    import cv2
+    (w, h) = calibration['size']
+    (u, v) = np.meshgrid(np.arange(width), np.arange(height))
+    pixels = np.dstack(((u + 0.5) * w / float(width) - 0.5, (v + 0.5) * h / float(height) - 0.5))
+    pixels = pixels.reshape(-1, 1, 2).astype(np.float32)
+    undistorted = cv2.undistortPoints(pixels, calibration['camera_matrix'], calibration['distortion'], P=calibration['camera_matrix'])
+    ground = cv2.perspectiveTransform(undistorted.astype(np.float64), calibration['homography'])
+    columns = ground[:, 0, 0].reshape(height, width).mean(axis=0)
+    columns -= columns[center]
+    if columns[-1] < columns[0]:
+        columns = -columns
+    if np.any(np.diff(columns) <= 0):
+        raise ValueError('Calibration does not map columns monotonically onto the ground')
+    return columns
+
+## Remap table
+"""
+For each column of the ideal grid, the fractional image column it falls on
+Ideal column j lies at (j - center) / pixel_per_cm cm; it is valid if it
+falls within the ground seen by the image, i.e. up to half a column beyond
+the edge columns. Invalid columns have no image behind them and read 0.
+Returns: index, index + 1, weight of the second and valid, one entry per column
+"""
+def remap_table(columns, center, pixel_per_cm):
+    width = len(columns)
+    ideal = (np.arange(width) - center) / float(pixel_per_cm)
+    source = np.interp(ideal, columns, np.arange(width, dtype=np.float64))
+    index = np.clip(np.floor(source).astype(np.intp), 0, width - 2)
+    left = columns[0] - (columns[1] - columns[0]) / 2.0
+    right = columns[-1] + (columns[-1] - columns[-2]) / 2.0
+    valid = (ideal >= left) & (ideal <= right)
+    return index, index + 1, source - index, valid
+
+## Class
+class Calibration:
+    def __init__(self, columns, index, index_next, weight, valid):
+        self.columns = columns
+        self.index = index
+        self.index_next = index_next
+        self.weight = weight
+        self.valid = valid
+
+    ## Resample a column-sum profile onto the ideal grid
+    """
+    Allocation free: writes into out, using scratch
+    Grid columns beyond the image are 0 rather than copies of the edge column,
+    which would otherwise outweigh every other column in find_offset
+    """
+    def apply(self, profile, out, scratch):
+        np.take(profile, self.index, out=out)
+        np.take(profile, self.index_next, out=scratch)
+        np.subtract(scratch, out, scratch)
+        np.multiply(scratch, self.weight, scratch)
+        np.add(out, scratch, out)
+        np.multiply(out, self.valid, out)
+        return out
+
+    ## Image column of an ideal grid column, e.g. to draw it on the frame
+    """
+    j is clipped to the grid, e.g. CAMERA_WIDTH when detection keeps failing
+    """
+    def column(self, j):
+        j = min(max(int(j), 0), len(self.index) - 1)
+        return int(round(self.index[j] + self.weight[j]))
+
+## Load
+"""
+Returns the Calibration of a camera at the running resolution, from the cache
+if it is newer than the calibration and matches the grid, otherwise rebuilt
+and cached (also when the cache predates the validity mask)
+Raises IOError if the camera has not been calibrated
+"""
+def load(directory, camera, width, height, center, pixel_per_cm):
+    base = base_path(directory, camera)
+    cache = cache_path(directory, camera, width, height)
+    if not os.path.exists(base):
+        raise IOError('No calibration at %s' % base)
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(base):
+        tables = np.load(cache)
+        if 'valid' in tables.files and int(tables['center']) == center and np.isclose(tables['pixel_per_cm'], pixel_per_cm):
+            return Calibration(tables['columns'], tables['index'], tables['index_next'], tables['weight'], tables['valid'])
+    columns = column_lookup(np.load(base), width, height, center)
+    (index, index_next, weight, valid) = remap_table(columns, center, pixel_per_cm)
+    save(cache, {
+        'columns' : columns,
+        'index' : index,
+        'index_next' : index_next,
+        'weight' : weight,
+        'valid' : valid,
+        'center' : np.array(center),
+        'pixel_per_cm' : np.array(pixel_per_cm),
+    })
+    return Calibration(columns, index, index_next, weight, valid)
+
+## Main
+if __name__ == '__main__':
+    import cv2
+    parser = argparse.ArgumentParser(description='Calibrate a camera against the ground plane')
+    parser.add_argument('config', help='mode file, e.g. modes/default.json')
+    parser.add_argument('camera', type=int, help='camera index')
+    parser.add_argument('images', help='checkerboard images, e.g. calibrations/camera0/*.png')
+    parser.add_argument('ground', help='image of the checkerboard lying flat on the ground, rows of corners across the crop row')
+    parser.add_argument('--board', default='9x6', help='inner corners of the board, columns x rows')
+    parser.add_argument('--square', type=float, default=2.5, help='side of a square (cm)')
+    args = parser.parse_args()
+
+    config = json.loads(open(args.config).read())
+    board = tuple(int(n) for n in args.board.split('x'))
+    images = [cv2.imread(path) for path in sorted(glob.glob(args.images))]
+    ground = cv2.imread(args.ground)
+    if config['CAMERA_ROTATED']: # calibrate in the orientation the frames are processed in
+        images = [cv2.transpose(bgr) for bgr in images]
+        ground = cv2.transpose(ground)
+    calibration = calibrate(images, ground, board, args.square)
+    path = base_path(config['CALIBRATION_DIR'], args.camera)
+    save(path, calibration)
+    print 'Calibrated camera #%d from %d images, RMS reprojection error %.3f px' % (args.camera, calibration['images'], calibration['rms'])
+    print 'Wrote %s' % path
+
+    # Build the cache for the configured resolution and compare to the ideal grid
+    if config['CAMERA_ROTATED']:
+        (width, height) = (config['CAMERA_HEIGHT'], config['CAMERA_WIDTH'])
+    else:
+        (width, height) = (config['CAMERA_WIDTH'], config['CAMERA_HEIGHT'])
+    center = width / 2
+    pixel_per_cm = width / (2 * config['CAMERA_DEPTH'] * np.tan(config['CAMERA_FOV'] / 2.0))
+    tables = load(config['CALIBRATION_DIR'], args.camera, width, height, center, pixel_per_cm)
+    print 'Ground covered: %.1f to %.1f cm' % (tables.columns[0], tables.columns[-1])
+    for j in [0, center - int(pixel_per_cm * config['ERROR_TOLERANCE']), center + int(pixel_per_cm * config['ERROR_TOLERANCE']), width - 1]:
+        print 'Column %d: %.1f cm (uncalibrated %.1f cm)' % (j, tables.columns[j], (j - center) / pixel_per_cm)
@@ -0,0 +1,9 @@
+"""
+Agri-Vision Simulator
+Batched closed-loop model of the camera, controller and side-shift hydraulics,
+for tuning the gains in modes/*.json without driving the tractor.
+"""
+
+from simulator.model import Controller, Implement, Sensor, camera_geometry, HYDRAULICS, SENSOR
+from simulator.offsets import synthesize
+from simulator.sweep import grid, simulate, sweep, rank, export
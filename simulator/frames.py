@@ -0,0 +1,93 @@
+"""
+Agri-Vision Simulator
+Sensor response measured on camera frames
+
+Rather than running the vision path once per simulated configuration, each
+frame is shifted across the field of view once and passed through
+AgriVision.plant_filter and AgriVision.find_offset. The result is a table of
+reported offset vs. true offset that the batched Sensor indexes per step.
+
+Requires OpenCV and the agrivision module, unlike the rest of the simulator.
+"""
+
+__author__ = 'Tsevor Stanhope'
+
+import glob
+import os
+import sys
+import numpy as np
+
+## Vision session without cameras, controller or logging
+def _session(config):
+    from agrivision import AgriVision
+    return AgriVision(config, headless=True, calibrate=False, CAMERAS=1, VERBOSE=False, DEBUG=False) # frames are shifted by image columns, keep offsets in them too
+
+## Synthetic frames
+"""
+Renders soil with a single crop row at the image center, plus scattered weeds
+Returns: list of BGR images
+"""
+def synthetic_frames(config, count=8, seed=0, row_width=0.1, density=0.6, weeds=0.02):
+    import cv2
+    if config['CAMERA_ROTATED']:
+        (w, h) = (config['CAMERA_HEIGHT'], config['CAMERA_WIDTH'])
+    else:
+        (w, h) = (config['CAMERA_WIDTH'], config['CAMERA_HEIGHT'])
+    rng = np.random.RandomState(seed)
+    x = np.arange(w) - w / 2
+    sigma = row_width * w
+    frames = []
+    for k in range(count):
+        hsv = np.dstack((rng.randint(5, 25, (h, w)), rng.randint(60, 140, (h, w)), rng.randint(60, 120, (h, w))))
+        plants = rng.rand(h, w) < density * np.exp(-x ** 2 / (2.0 * sigma ** 2))
+        plants |= rng.rand(h, w) < weeds
+        n = plants.sum()
+        hsv[plants] = np.column_stack((rng.randint(50, 80, n), rng.randint(150, 256, n), rng.randint(80, 200, n)))
+        frames.append(cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR))
+    return frames
+
+## Replayed frames
+"""
+Loads field images, e.g. data/*.jpg, at the configured resolution
+Returns: list of BGR images
+"""
+def replay_frames(config, pattern):
+    import cv2
+    if config['CAMERA_ROTATED']:
+        (w, h) = (config['CAMERA_HEIGHT'], config['CAMERA_WIDTH'])
+    else:
+        (w, h) = (config['CAMERA_WIDTH'], config['CAMERA_HEIGHT'])
+    return [cv2.resize(cv2.imread(path), (w, h)) for path in sorted(glob.glob(pattern))]
+
+## Measurement table
+"""
+1. Find where the vision path places the row in each unshifted frame
+2. Roll the frame so the row sits at every column of the image
+3. Record the offset the vision path reports, CAMERA_CENTER on failure
+Returns: int array of shape (frames, width), indexed by true offset + center
+"""
+def measurement_table(config, frames):
+    vision = _session(config)
+    center = vision.CAMERA_CENTER
+    width = vision.CAMERA_WIDTH
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w') # plant_filter reports every call
+    try:
+        table = []
+        for bgr in frames:
+            (offsets, sums) = vision.find_offset(vision.plant_filter([bgr]))
+            if not offsets:
+                continue
+            base = offsets[0]
+            row = np.empty(width, int)
+            for true in range(-center, width - center):
+                shifted = np.roll(bgr, true - base, axis=1)
+                (offsets, sums) = vision.find_offset(vision.plant_filter([shifted]))
+                row[true + center] = offsets[0] if offsets else center
+            table.append(row)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    if not table:
+        raise ValueError('No row detected in any frame')
+    return np.array(table)
@@ -0,0 +1,138 @@
+"""
+Agri-Vision Simulator
+Vectorized models of the steering loop
+
+Every state variable is a 1-D array with one entry per simulated
+configuration, so a single call to step() advances thousands of closed loops.
+"""
+
+__author__ = 'Tsevor Stanhope'
+
+import numpy as np
+
+## Constants
+HYDRAULICS = {
+    "VALVE_DEADBAND" : 0.4, # V either side of the center voltage with no flow
+    "VALVE_TAU" : 0.15, # s, first order lag of the spool
+    "MAX_SPEED" : 12.0, # cm/s of side-shift at full valve opening
+    "STROKE" : 30.0, # cm of travel either side of center
+    "DIRECTION" : 1 # sign of motion for PWM above center
+}
+SENSOR = {
+    "NOISE" : 1.0, # px, standard deviation of the detected offset
+    "DROPOUT" : 0.02 # probability that no row is found in a frame
+}
+
+## Camera geometry
+"""
+Same derivation as AgriVision.init_vision
+Returns: width (px), center (px), pixel-per-cm
+"""
+def camera_geometry(config):
+    if config['CAMERA_ROTATED']:
+        width = config['CAMERA_HEIGHT']
+    else:
+        width = config['CAMERA_WIDTH']
+    center = width / 2
+    ground_width = 2 * config['CAMERA_DEPTH'] * np.tan(config['CAMERA_FOV'] / 2.0)
+    return width, center, width / ground_width
+
+## Sensor
+"""
+Converts the lateral error between row and implement into the offset that
+AgriVision.find_offset / estimate_row would report.
+1. Project the error (cm) to pixels
+2. Either add noise, or look up the response measured on frames
+3. Clip to the field of view
+4. Dropped frames report CAMERA_CENTER, as estimate_row does on failure
+Noise and dropouts are drawn per scenario and shared by all configurations,
+so every configuration is scored against the same disturbances.
+"""
+class Sensor:
+    def __init__(self, config, configs, scenarios, sensor=SENSOR, table=None, seed=0):
+        (self.width, self.center, self.pixel_per_cm) = camera_geometry(config)
+        self.noise = sensor['NOISE']
+        self.dropout = sensor['DROPOUT']
+        self.table = table
+        self.configs = configs
+        self.scenarios = scenarios
+        self.frame = 0
+        self.rng = np.random.RandomState(seed)
+
+    def measure(self, error):
+        true = np.clip(np.rint(error * self.pixel_per_cm), -self.center, self.width - 1 - self.center)
+        if self.table is not None:
+            est = self.table[self.frame % len(self.table)][true.astype(int) + self.center].astype(float)
+            self.frame += 1
+        else:
+            noise = np.tile(np.rint(self.rng.normal(0, self.noise, self.scenarios)), self.configs)
+            dropped = np.tile(self.rng.rand(self.scenarios) < self.dropout, self.configs)
+            est = np.clip(true + noise, -self.center, self.width - 1 - self.center)
+            est[dropped] = self.center
+        return est
+
+## Controller
+"""
+Batched copy of AgriVision.estimate_row and AgriVision.calculate_output
+Arguments: config, and arrays of P_COEF, I_COEF, D_COEF, NUM_AVERAGES
+Each row of the history is a ring buffer of NUM_AVERAGES entries, seeded
+with CAMERA_CENTER like init_pid, and the running sum is kept alongside it.
+"""
+class Controller:
+    def __init__(self, config, p, i, d, n):
+        (width, self.center, ppc) = camera_geometry(config)
+        self.p = np.asarray(p, float)
+        self.i = np.asarray(i, float)
+        self.d = np.asarray(d, float)
+        self.n = np.asarray(n, int)
+        self.PWM_MIN = config['PWM_MIN']
+        self.PWM_MAX = config['PWM_MAX']
+        self.CENTER_PWM = int(self.PWM_MIN + self.PWM_MAX / 2.0)
+        self.rows = np.arange(len(self.n))
+        self.history = np.zeros((len(self.n), self.n.max()))
+        self.history[np.arange(self.n.max()) < self.n[:, np.newaxis]] = self.center
+        self.total = self.center * self.n.astype(float)
+        self.t = 0
+
+    def step(self, est):
+        k = self.t % self.n
+        self.total += est - self.history[self.rows, k]
+        self.history[self.rows, k] = est
+        self.t += 1
+        avg = np.trunc(self.total / self.n)
+        diff = est - avg
+        pwm = np.trunc(est * self.p + avg * self.i + diff * self.d + self.CENTER_PWM)
+        return np.clip(pwm, self.PWM_MIN, self.PWM_MAX)
+
+## Implement
+"""
+Lateral dynamics of the side-shift hitch
+1. PWM --> voltage, as in AgriVision.calculate_output
+2. Voltage --> valve opening, with a deadband around the center voltage
+3. Spool follows the opening with a first order lag
+4. Cylinder speed is proportional to the spool, travel is limited to the stroke
+"""
+class Implement:
+    def __init__(self, config, size, rate, hydraulics=HYDRAULICS):
+        self.PWM_MIN = config['PWM_MIN']
+        self.PWM_MAX = config['PWM_MAX']
+        self.MIN_VOLTAGE = config['MIN_VOLTAGE']
+        self.MAX_VOLTAGE = config['MAX_VOLTAGE']
+        self.center_volts = self.volts(int(self.PWM_MIN + self.PWM_MAX / 2.0))
+        self.span = max(self.volts(self.PWM_MAX) - self.center_volts, self.center_volts - self.volts(self.PWM_MIN))
+        self.deadband = hydraulics['VALVE_DEADBAND']
+        self.alpha = 1 - np.exp(-1.0 / (rate * hydraulics['VALVE_TAU']))
+        self.speed = hydraulics['DIRECTION'] * hydraulics['MAX_SPEED'] / float(rate)
+        self.stroke = hydraulics['STROKE']
+        self.spool = np.zeros(size)
+        self.position = np.zeros(size)
+
+    def volts(self, pwm):
+        return pwm * (self.MAX_VOLTAGE - self.MIN_VOLTAGE) / float(self.PWM_MAX - self.PWM_MIN) + self.MIN_VOLTAGE
+
+    def step(self, pwm):
+        dv = self.volts(pwm) - self.center_volts
+        opening = np.sign(dv) * np.clip(np.abs(dv) - self.deadband, 0, None) / (self.span - self.deadband)
+        self.spool += self.alpha * (opening - self.spool)
+        self.position = np.clip(self.position + self.speed * self.spool, -self.stroke, self.stroke)
+        return self.position
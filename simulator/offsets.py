@@ -0,0 +1,29 @@
+"""
+Agri-Vision Simulator
+Synthetic crop row trajectories
+
+The lateral position of the row relative to the tractor is the sum of
+1. Slow curves in the row (sinusoid with random period and phase)
+2. Steering drift of the tractor (random walk)
+3. Occasional jumps, e.g. planter skips or the tractor correcting course
+"""
+
+__author__ = 'Tsevor Stanhope'
+
+import numpy as np
+
+## Synthesize
+"""
+Arguments: duration (s), rate (Hz), scenarios
+Returns: array of row positions (cm), shape (scenarios, duration * rate)
+"""
+def synthesize(duration, rate, scenarios=1, seed=0, amplitude=5.0, period=20.0, drift=0.5, jumps=0.02, jump_size=3.0):
+    rng = np.random.RandomState(seed)
+    samples = int(duration * rate)
+    t = np.arange(samples) / float(rate)
+    phase = rng.uniform(0, 2 * np.pi, (scenarios, 1))
+    periods = period * rng.uniform(0.5, 1.5, (scenarios, 1))
+    curve = amplitude * np.sin(2 * np.pi * t / periods + phase)
+    walk = np.cumsum(rng.normal(0, drift / np.sqrt(rate), (scenarios, samples)), axis=1)
+    steps = (rng.rand(scenarios, samples) < jumps / float(rate)) * rng.normal(0, jump_size, (scenarios, samples))
+    return curve + walk + np.cumsum(steps, axis=1)
@@ -0,0 +1,173 @@
+"""
+Agri-Vision Simulator
+Closed-loop gain sweep
+
+Runs every combination of P_COEF, I_COEF, D_COEF and NUM_AVERAGES against the
+same synthetic rows, ranks them by tracking error and actuator effort, and
+writes the best one out as a mode file.
+
+Usage:
+    python -m simulator.sweep modes/default.json --out modes/tuned.json
+    python -m simulator.sweep modes/default.json --p 0:8:17 --n 4,8,16 --workers 4
+    python -m simulator.sweep modes/default.json --frames replay --images 'data/*.jpg'
+"""
+
+__author__ = 'Tsevor Stanhope'
+
+import argparse
+import json
+import multiprocessing
+import numpy as np
+from simulator.model import Controller, Implement, Sensor, HYDRAULICS, SENSOR
+from simulator.offsets import synthesize
+
+## Constants
+GAINS = ['P_COEF', 'I_COEF', 'D_COEF', 'NUM_AVERAGES']
+EFFORT_WEIGHT = 2.0 # cm of RMS error traded for full-scale valve effort
+
+## Grid
+"""
+Returns a dict of flat arrays, one entry per combination of the given values
+"""
+def grid(p, i, d, n):
+    mesh = np.meshgrid(p, i, d, n, indexing='ij')
+    gains = dict((key, m.ravel()) for (key, m) in zip(GAINS, mesh))
+    gains['NUM_AVERAGES'] = gains['NUM_AVERAGES'].astype(int)
+    return gains
+
+## Simulate
+"""
+Closes the loop for every configuration in gains against every scenario in
+offsets (cm, shape scenarios x samples)
+Returns a dict of arrays, one entry per configuration, averaged over scenarios:
+    ERROR_RMS : RMS lateral error between row and implement (cm)
+    ERROR_MAX : worst lateral error (cm)
+    EFFORT : mean valve command, 0 (centered) to 1 (full scale)
+    CHATTER : mean change of PWM per step, as a fraction of the PWM range
+"""
+def simulate(config, gains, offsets, rate, hydraulics=HYDRAULICS, sensor=SENSOR, table=None, seed=0):
+    configs = len(gains['P_COEF'])
+    (scenarios, samples) = offsets.shape
+    size = configs * scenarios
+    controller = Controller(config, *[np.repeat(gains[key], scenarios) for key in GAINS])
+    implement = Implement(config, size, rate, hydraulics)
+    camera = Sensor(config, configs, scenarios, sensor, table, seed)
+    pwm_range = float(config['PWM_MAX'] - config['PWM_MIN'])
+    half_range = max(config['PWM_MAX'] - controller.CENTER_PWM, controller.CENTER_PWM - config['PWM_MIN'])
+    previous = np.empty(size)
+    previous.fill(controller.CENTER_PWM)
+    squared = np.zeros(size)
+    peak = np.zeros(size)
+    effort = np.zeros(size)
+    chatter = np.zeros(size)
+    for t in range(samples):
+        error = np.tile(offsets[:, t], configs) - implement.position
+        squared += error ** 2
+        np.maximum(peak, np.abs(error), peak)
+        pwm = controller.step(camera.measure(error))
+        implement.step(pwm)
+        effort += np.abs(pwm - controller.CENTER_PWM) / float(half_range)
+        chatter += np.abs(pwm - previous) / pwm_range
+        previous = pwm
+    results = {
+        'ERROR_RMS' : np.sqrt(squared / samples),
+        'ERROR_MAX' : peak,
+        'EFFORT' : effort / samples,
+        'CHATTER' : chatter / samples,
+    }
+    return dict((key, value.reshape(configs, scenarios).mean(axis=1)) for (key, value) in results.items())
+
+def _simulate(args):
+    return simulate(*args)
+
+## Sweep
+"""
+Same as simulate, but splits the configurations across a process pool
+"""
+def sweep(config, gains, offsets, rate, hydraulics=HYDRAULICS, sensor=SENSOR, table=None, seed=0, workers=1, chunks=4):
+    if workers <= 1:
+        return simulate(config, gains, offsets, rate, hydraulics, sensor, table, seed)
+    configs = len(gains['P_COEF'])
+    splits = np.array_split(np.arange(configs), workers * chunks)
+    jobs = [(config, dict((key, gains[key][s]) for key in GAINS), offsets, rate, hydraulics, sensor, table, seed) for s in splits if len(s)]
+    pool = multiprocessing.Pool(workers)
+    try:
+        parts = pool.map(_simulate, jobs)
+    finally:
+        pool.close()
+        pool.join()
+    return dict((key, np.concatenate([part[key] for part in parts])) for key in parts[0])
+
+## Rank
+"""
+Cost = RMS error + EFFORT_WEIGHT * (effort + chatter)
+Returns: costs, and indices of configurations from best to worst
+"""
+def rank(results, effort_weight=EFFORT_WEIGHT):
+    cost = results['ERROR_RMS'] + effort_weight * (results['EFFORT'] + results['CHATTER'])
+    return cost, np.argsort(cost, kind='mergesort')
+
+## Export
+"""
+Copies the mode with the gains of configuration index, and writes it to path
+Returns: the new mode
+"""
+def export(config, gains, index, path=None):
+    mode = dict(config)
+    for key in GAINS:
+        mode[key] = gains[key][index].item()
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump(mode, f, indent=4, sort_keys=True, separators=(',', ' : '))
+            f.write('\n')
+    return mode
+
+def _values(text):
+    if ':' in text:
+        (start, stop, count) = text.split(':')
+        return np.linspace(float(start), float(stop), int(count))
+    return np.array([float(v) for v in text.split(',')])
+
+## Main
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sweep steering gains in simulation')
+    parser.add_argument('config', help='mode file to start from, e.g. modes/default.json')
+    parser.add_argument('--out', default='modes/tuned.json', help='mode file to write the best gains to')
+    parser.add_argument('--p', default='0:10:11', help='P_COEF values, start:stop:count or a comma list')
+    parser.add_argument('--i', default='0:4:9', help='I_COEF values')
+    parser.add_argument('--d', default='0:4:9', help='D_COEF values')
+    parser.add_argument('--n', default='1,2,4,8,16,32,64', help='NUM_AVERAGES values')
+    parser.add_argument('--duration', type=float, default=60.0, help='seconds per scenario')
+    parser.add_argument('--scenarios', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=None, help='loop rate in Hz, defaults to CAMERA_FPS')
+    parser.add_argument('--frames', choices=['none', 'synthetic', 'replay'], default='none', help='measure the sensor on frames instead of adding noise')
+    parser.add_argument('--images', default='data/*.jpg', help='images to replay with --frames replay')
+    parser.add_argument('--effort-weight', type=float, default=EFFORT_WEIGHT)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    config = json.loads(open(args.config).read())
+    rate = args.rate or config['CAMERA_FPS']
+    table = None
+    if args.frames != 'none':
+        from simulator import frames
+        if args.frames == 'synthetic':
+            images = frames.synthetic_frames(config, seed=args.seed)
+        else:
+            images = frames.replay_frames(config, args.images)
+        table = frames.measurement_table(config, images)
+    gains = grid(_values(args.p), _values(args.i), _values(args.d), _values(args.n))
+    offsets = synthesize(args.duration, rate, args.scenarios, args.seed)
+    print 'Simulating %d configurations x %d scenarios x %d steps' % (len(gains['P_COEF']), args.scenarios, offsets.shape[1])
+    results = sweep(config, gains, offsets, rate, table=table, seed=args.seed, workers=args.workers)
+    (cost, order) = rank(results, args.effort_weight)
+
+    print '%6s %6s %6s %4s | %8s %8s %6s %7s | %6s' % ('P', 'I', 'D', 'N', 'RMS cm', 'MAX cm', 'EFFORT', 'CHATTER', 'COST')
+    for k in order[:args.top]:
+        print '%6.2f %6.2f %6.2f %4d | %8.2f %8.2f %6.3f %7.4f | %6.2f' % (
+            gains['P_COEF'][k], gains['I_COEF'][k], gains['D_COEF'][k], gains['NUM_AVERAGES'][k],
+            results['ERROR_RMS'][k], results['ERROR_MAX'][k], results['EFFORT'][k], results['CHATTER'][k], cost[k])
+    export(config, gains, order[0], args.out)
+    print 'Wrote %s' % args.out
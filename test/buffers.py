@@ -0,0 +1,103 @@
+"""
+Allocation regression check for the frame buffer pool
+
+Replays the sample images in data/ through the capture -> mask -> offset path
+and fails if any stage returns an array the pool does not own, if any pooled
+buffer was reallocated along the way, or if the offsets and sums differ from
+the plain NumPy computation the pool replaced.
+
+Usage: python test/buffers.py [config]
+"""
+
+import cv2
+import glob
+import os
+import sys
+import numpy
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, ROOT)
+from agrivision import AgriVision
+
+CONFIG_FILE = os.path.join(ROOT, 'modes', 'default.json')
+IMAGES = os.path.join(ROOT, 'data', '*.jpg')
+ITERATIONS = 200
+
+## Replays still images as a camera, reading into the caller's buffer
+class Replay:
+    def __init__(self, paths, width, height):
+        self.images = [cv2.resize(cv2.imread(p), (width, height)) for p in paths]
+        self.count = 0
+    def read(self, image=None):
+        src = self.images[self.count % len(self.images)]
+        self.count += 1
+        if image is None or image.shape != src.shape:
+            return True, src.copy()
+        numpy.copyto(image, src)
+        return True, image
+    def release(self):
+        pass
+
+try:
+    config_file = sys.argv[1]
+except IndexError:
+    config_file = CONFIG_FILE
+
+## Offset of a frame as computed before the pool
+"""
+Returns (offset, sum), or None if no row is found
+"""
+def reference(session, bgr):
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    threshold_min = numpy.array([session.HUE_MIN, session.SAT_MIN, session.VAL_MIN], numpy.uint8)
+    threshold_max = numpy.array([session.HUE_MAX, session.SAT_MAX, session.VAL_MAX], numpy.uint8)
+    threshold_min[1] = numpy.percentile(hsv[:,:,1], 100 * session.SAT_MIN / 255.0)
+    threshold_min[2] = numpy.percentile(hsv[:,:,2], 100 * session.VAL_MIN / 255.0)
+    threshold_max[1] = 255
+    threshold_max[2] = numpy.percentile(hsv[:,:,2], 100 * session.VAL_MAX / 255.0)
+    mask = cv2.inRange(hsv, threshold_min, threshold_max)
+    column_sum = mask.sum(axis=0)
+    threshold = numpy.percentile(column_sum, session.THRESHOLD_PERCENTILE)
+    probable = numpy.nonzero(column_sum >= threshold)
+    if len(probable[0]) == 0:
+        return None
+    best = int(numpy.median(probable[0]))
+    return best - session.CAMERA_CENTER, column_sum[best]
+
+session = AgriVision(config_file, headless=True, VERBOSE=False, DEBUG=False)
+if session.CAMERA_ROTATED:
+    (w, h) = (session.CAMERA_HEIGHT, session.CAMERA_WIDTH)
+else:
+    (w, h) = (session.CAMERA_WIDTH, session.CAMERA_HEIGHT)
+paths = sorted(glob.glob(IMAGES))
+if len(paths) < 2 * session.CAMERAS:
+    raise IOError('Not enough images in %s' % IMAGES)
+session.cameras = [Replay(paths[i::session.CAMERAS], w, h) for i in range(session.CAMERAS)]
+pool = session.pool
+errors = []
+for n in range(ITERATIONS):
+    images = session.capture_images()
+    masks = session.plant_filter(images)
+    offsets, sums = session.find_offset(masks)
+    session.estimate_row(offsets, sums)
+    expected = [(i, reference(session, img)) for (i, img) in enumerate(images) if img is not None]
+    expected = [(i, e) for (i, e) in expected if e is not None] # find_offset skips frames without a row
+    if len(expected) != len(offsets):
+        errors.append('iteration %d: %d offsets, NumPy found %d' % (n, len(offsets), len(expected)))
+    for ((i, e), found) in zip(expected, zip(offsets, sums)):
+        if session.calibrations[i] is None and found != e: # calibrated profiles are resampled first
+            errors.append('iteration %d: camera #%d found %s, NumPy %s' % (n, i, found, e))
+    for (i, img) in enumerate(images):
+        if img is not None and not pool.owns(img):
+            errors.append('iteration %d: image #%d not pooled' % (n, i))
+    for (i, mask) in enumerate(masks):
+        if mask is not None and not pool.owns(mask):
+            errors.append('iteration %d: mask #%d not pooled' % (n, i))
+errors.extend(pool.check())
+
+if errors:
+    for error in errors:
+        print 'FAIL: %s' % error
+    sys.exit(1)
+else:
+    print 'OK: %d iterations, no per-frame allocations, offsets match NumPy' % ITERATIONS
@@ -0,0 +1,108 @@
+"""
+Check of the ground-plane calibration tables
+
+1. A calibration without distortion whose homography is the ideal grid must
+   leave the column-sum profile unchanged, and be served from the cache the
+   second time it is loaded
+2. A calibration with lens distortion and a tilted camera must map columns
+   monotonically onto the ground, and zero the grid beyond the image edges,
+   so weeds in an edge column do not outweigh the crop row
+
+Usage: python test/calibration.py
+"""
+
+import cv2
+import os
+import shutil
+import sys
+import tempfile
+import numpy
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, ROOT)
+import calibration
+
+WIDTH = 160
+HEIGHT = 120
+CENTER = WIDTH / 2
+PIXEL_PER_CM = 2.05
+K = numpy.array([[120.0, 0, WIDTH / 2.0], [0, 120.0, HEIGHT / 2.0], [0, 0, 1]])
+
+def never(*args):
+    raise AssertionError('column lookup rebuilt instead of read from the cache')
+
+directory = tempfile.mkdtemp()
+errors = []
+try:
+    # Ideal camera: no distortion, ground = pixels / PIXEL_PER_CM
+    calibration.save(calibration.base_path(directory, 0), {
+        'size' : numpy.array([WIDTH, HEIGHT]),
+        'camera_matrix' : K,
+        'distortion' : numpy.zeros(5),
+        'homography' : numpy.diag([1 / PIXEL_PER_CM, 1 / PIXEL_PER_CM, 1]),
+    })
+    tables = calibration.load(directory, 0, WIDTH, HEIGHT, CENTER, PIXEL_PER_CM)
+    profile = numpy.random.RandomState(0).randint(0, 255 * HEIGHT, WIDTH).astype(numpy.float64)
+    out = numpy.zeros(WIDTH)
+    scratch = numpy.zeros(WIDTH)
+    if not numpy.allclose(tables.apply(profile, out, scratch), profile):
+        errors.append('ideal calibration changed the profile')
+    if not numpy.allclose(tables.columns, (numpy.arange(WIDTH) - CENTER) / PIXEL_PER_CM):
+        errors.append('ideal calibration lookup is not (column - center) / pixel_per_cm')
+    if not os.path.exists(calibration.cache_path(directory, 0, WIDTH, HEIGHT)):
+        errors.append('no cache written for %dx%d' % (WIDTH, HEIGHT))
+    lookup = calibration.column_lookup
+    calibration.column_lookup = never
+    try:
+        cached = calibration.load(directory, 0, WIDTH, HEIGHT, CENTER, PIXEL_PER_CM)
+        if not numpy.array_equal(cached.index, tables.index) or not numpy.array_equal(cached.weight, tables.weight):
+            errors.append('cached tables differ from the built ones')
+    except AssertionError as error:
+        errors.append(str(error))
+    finally:
+        calibration.column_lookup = lookup
+
+    # Barrel distortion, camera rolled and pitched over the ground
+    R = cv2.Rodrigues(numpy.array([0.3, 0.1, 0.05]))[0]
+    ground_to_pixels = K.dot(numpy.column_stack((R[:, 0], R[:, 1], [0, 0, 100.0])))
+    calibration.save(calibration.base_path(directory, 1), {
+        'size' : numpy.array([2 * WIDTH, 2 * HEIGHT]), # calibrated at a higher resolution
+        'camera_matrix' : K * [[2], [2], [1]],
+        'distortion' : numpy.array([-0.3, 0.1, 0, 0, 0]),
+        'homography' : numpy.linalg.inv(ground_to_pixels).dot(numpy.diag([0.5, 0.5, 1])),
+    })
+    wide = 0.5 # px/cm, so the ideal grid extends past both edges of the image
+    tables = calibration.load(directory, 1, WIDTH, HEIGHT, CENTER, wide)
+    if not numpy.all(numpy.diff(tables.columns) > 0):
+        errors.append('distorted lookup is not monotonic')
+    if abs(tables.columns[CENTER]) > 1e-9:
+        errors.append('distorted lookup is not zero at the center column')
+    if tables.valid[0] or tables.valid[-1] or not tables.valid[CENTER]:
+        errors.append('grid beyond the image not marked invalid: %s' % numpy.nonzero(tables.valid)[0])
+    inside = numpy.nonzero(tables.valid)[0]
+    if len(inside) != inside[-1] - inside[0] + 1:
+        errors.append('valid grid columns are not contiguous')
+    resampled = tables.apply(profile, out, scratch)
+    if numpy.any(resampled[~tables.valid] != 0):
+        errors.append('grid beyond the image is not 0')
+
+    # Weeds in the last image column must not pull the offset to the edge
+    tables = calibration.load(directory, 0, WIDTH, HEIGHT, CENTER, 0.7 * PIXEL_PER_CM) # grid 1/0.7 times wider than the image
+    row = numpy.random.RandomState(1).uniform(0, 0.05 * 255 * HEIGHT, WIDTH) # soil
+    row[CENTER + 7:CENTER + 13] = 0.8 * 255 * HEIGHT # crop row at +10 image px
+    row[-1] = 0.3 * 255 * HEIGHT # weeds
+    resampled = tables.apply(row, out, scratch)
+    best = int(numpy.median(numpy.nonzero(resampled >= numpy.percentile(resampled, 95))[0])) - CENTER
+    if abs(best - 7) > 2:
+        errors.append('crop row at +10 image px found at %+d grid px, expected +7' % best)
+    if [tables.column(j) for j in (-5, WIDTH, 10 * WIDTH)] != [0, WIDTH - 1, WIDTH - 1]:
+        errors.append('column() does not clip to the image')
+finally:
+    shutil.rmtree(directory)
+
+if errors:
+    for error in errors:
+        print 'FAIL: %s' % error
+    sys.exit(1)
+else:
+    print 'OK: ideal calibration is the identity and cached, distorted calibration is monotonic, grid beyond the image is 0'
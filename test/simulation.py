@@ -0,0 +1,70 @@
+"""
+Equivalence check for the batched steering simulator
+
+Steps simulator.Controller next to AgriVision.estimate_row and
+AgriVision.calculate_output for random gains and NUM_AVERAGES, including
+frames where no row is found, and fails if any PWM differs. Also fails if
+splitting a sweep across a process pool changes its results.
+
+Usage: python test/simulation.py [config]
+"""
+
+import json
+import os
+import sys
+import numpy
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, ROOT)
+from agrivision import AgriVision
+from simulator import Controller, grid, simulate, sweep, synthesize
+
+CONFIG_FILE = os.path.join(ROOT, 'modes', 'default.json')
+CONFIGS = 50
+STEPS = 300
+DROPOUT = 0.05
+
+try:
+    config_file = sys.argv[1]
+except IndexError:
+    config_file = CONFIG_FILE
+config = json.loads(open(config_file).read())
+rng = numpy.random.RandomState(0)
+errors = []
+
+# Controller vs. estimate_row + calculate_output
+p = rng.uniform(0, 10, CONFIGS)
+i = rng.uniform(0, 4, CONFIGS)
+d = rng.uniform(0, 4, CONFIGS)
+n = rng.randint(1, 65, CONFIGS)
+controller = Controller(config, p, i, d, n)
+sessions = [AgriVision(config, headless=True, calibrate=False, VERBOSE=False, P_COEF=p[k], I_COEF=i[k], D_COEF=d[k], NUM_AVERAGES=n[k]) for k in range(CONFIGS)]
+center = sessions[0].CAMERA_CENTER
+for t in range(STEPS):
+    est = rng.randint(-center, center, CONFIGS)
+    dropped = rng.rand(CONFIGS) < DROPOUT
+    pwm = controller.step(numpy.where(dropped, center, est).astype(float))
+    for k in range(CONFIGS):
+        if dropped[k]:
+            (offsets, sums) = ([], []) # estimate_row falls back to CAMERA_CENTER
+        else:
+            (offsets, sums) = ([int(est[k])], [1])
+        expected = sessions[k].calculate_output(*sessions[k].estimate_row(offsets, sums))[0]
+        if pwm[k] != expected:
+            errors.append('step %d, config #%d: Controller %d, AgriVision %d' % (t, k, pwm[k], expected))
+
+# Process pool vs. a single process
+gains = grid(numpy.linspace(0, 8, 5), [0, 1.5], [0, 1], [1, 8, 32])
+offsets = synthesize(10, config['CAMERA_FPS'], 3)
+single = simulate(config, gains, offsets, config['CAMERA_FPS'])
+pooled = sweep(config, gains, offsets, config['CAMERA_FPS'], workers=2)
+for key in sorted(single):
+    if not numpy.array_equal(single[key], pooled[key]):
+        errors.append('sweep %s differs with workers=2' % key)
+
+if errors:
+    for error in errors:
+        print 'FAIL: %s' % error
+    sys.exit(1)
+else:
+    print 'OK: %d configurations x %d steps match AgriVision, sweep matches across workers' % (CONFIGS, STEPS)